@@ -1,15 +1,24 @@
+import asyncio
+import hashlib
 import os
-import tempfile
+import string
 import streamlit as st
 from dotenv import load_dotenv
-from elsai_core.model import AzureOpenAIConnector
-from elsai_core.extractors.azure_document_intelligence import AzureDocumentIntelligence
 from elsai_core.config.loggerConfig import setup_logger
-from elsai_core.prompts import PezzoPromptRenderer
+from invoice_helpers import FENCE_RE, format_table, pack_documents, split_batch_response, strip_markdown_fences
+# Azure and elsai_core SDKs are imported where they are first used, so the upload page renders
+# without loading them
 load_dotenv()
 # Initialize logger
 logger = setup_logger()
 
+BATCH_INSTRUCTIONS = """
+The content of $count invoices follows. Each invoice starts with a line "=== INVOICE <number> ===".
+Process every invoice separately as instructed above. Return only a JSON object of the form
+{"invoices": [{"invoice": <number>, "markdown": "<the markdown result for that invoice>"}]}
+with one entry per invoice.
+"""
+
 # Set page config
 st.set_page_config(
     page_title="Invoice Parser",
@@ -17,112 +26,420 @@ st.set_page_config(
     layout="wide"
 )
 
-def extract_content_from_pdf(pdf_path):
+@st.cache_resource(show_spinner=False)
+def get_llm():
+    """
+    Connect to the Azure OpenAI model once and share it across reruns and files.
+    """
+    from elsai_core.model import AzureOpenAIConnector
+    
+    logger.info("Initializing LLM connector")
+    connector = AzureOpenAIConnector()
+    llm = connector.connect_azure_open_ai(deploymentname="gpt-4o-mini")
+    logger.info("LLM connector initialized")
+    return llm
+
+@st.cache_resource(show_spinner=False)
+def get_di_client(endpoint, key):
+    """
+    Create the Azure Document Intelligence client once and share it across reruns and files.
+    """
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+    from azure.core.credentials import AzureKeyCredential
+    
+    logger.info("Initializing Document Intelligence client")
+    return DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+
+@st.cache_resource(show_spinner=False)
+def get_embedding_model():
+    """
+    Create the embedding model used by the LLM response cache once.
+    """
+    from elsai_core.embeddings import AzureOpenAIEmbeddingModel
+    
+    return AzureOpenAIEmbeddingModel(model="text-embedding-3-small")
+
+@st.cache_resource(show_spinner=False)
+def get_llm_cache():
+    """
+    Create the LLM response cache once.
+    """
+    from elsai_core.llm_services import SemanticLLMCache
+    
+    # Similar invoices from the same vendor embed close together, so matching by
+    # similarity is opt-in and only exact prompt hits are served by default
+    threshold = os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD")
+    return SemanticLLMCache(
+        db_path=os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite"),
+        similarity_threshold=float(threshold) if threshold else None,
+        ttl_days=7
+    )
+
+@st.cache_data(show_spinner=False, max_entries=128, ttl=86400)
+def extract_content_from_pdf(pdf_bytes: bytes):
     """
     Extract tables and text from a PDF file using Azure Document Intelligence.
     
+    Results are cached on the PDF bytes, so reruns and re-uploads of the same
+    invoice do not hit Azure again. st.cache_data cannot memoize coroutines,
+    so callers on the event loop run this in a worker thread.
+    
     Args:
-        pdf_path (str): Path to the PDF file
-        endpoint (str): Azure Document Intelligence endpoint
-        key (str): Azure Document Intelligence API key
+        pdf_bytes (bytes): Content of the PDF file
         
     Returns:
-        tuple: (extracted_text, extracted_tables)
+        tuple: (extracted_text, formatted_tables)
     """
-    logger.info(f"Starting extraction from PDF: {os.path.basename(pdf_path)}")
+    from elsai_core.extractors.azure_document_intelligence import AzureDocumentIntelligence
+    
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    logger.info(f"Starting extraction from PDF with SHA256 {digest}")
     
     try:
-
-        doc_processor = AzureDocumentIntelligence(pdf_path)
-        logger.debug("Extracting text")
-        extracted_text = doc_processor.extract_text()
+        client = get_di_client(st.secrets["VISION_ENDPOINT"], st.secrets["VISION_KEY"])
+        doc_processor = AzureDocumentIntelligence(client=client, file_bytes=pdf_bytes)
+        logger.debug("Extracting text and tables")
+        extracted_text, extracted_tables = doc_processor.extract_content()
         
-        # Extract tables
-        logger.debug("Extracting tables")
-        extracted_tables = doc_processor.extract_tables()
-        
-        logger.info(f"Extraction complete. Found {len(extracted_text)} pages of text and {len(extracted_tables)} tables")
-        return extracted_text, extracted_tables
+        logger.info(f"Extraction complete. Found {len(extracted_text)} characters of text and {len(extracted_tables)} tables")
+        # Cache the formatted tables rather than the per-cell dictionaries, so a cache
+        # hit only has to unpickle a string
+        return extracted_text, format_table(extracted_tables)
     
     except Exception as e:
         logger.error(f"Error extracting content from PDF: {str(e)}", exc_info=True)
         raise
-def format_table(tables):
+def lookup_cached_response(prompt_txt, document_text=None):
+    """
+    Look up an LLM response in the two-tier response cache.
+    
+    The exact prompt hash is checked first. If semantic lookups are enabled, the
+    embedding of the document text is then compared against cached documents. Only
+    the document text is embedded so the shared prompt instructions do not inflate
+    the similarity.
+    
+    Args:
+        prompt_txt: The full prompt
+        document_text: The text and tables extracted from the document, or None to
+            only look up the exact prompt
+        
+    Returns:
+        tuple: (cached_result or None, embedding of the document text or None)
+    """
+    cache = get_llm_cache()
+    result = cache.lookup(prompt_txt)
+    if result is not None:
+        return result, None
+    if document_text is None or cache.similarity_threshold is None:
+        return None, None
+    
+    embedding = get_embedding_model().embed_query(document_text)
+    if embedding:
+        result = cache.lookup_similar(embedding)
+    return result, embedding
+
+def lookup_cached_documents(templates, documents):
     """
-    Format the table into a string representation.
+    Look up the cached result of each document under its single-document prompt.
     
     Args:
-        table: The table object to format
+        templates: The prompt templates from get_prompt_templates
+        documents: List of (index, file_name, text_content, tables_str) tuples
+        
+    Returns:
+        list: Cached result or None for each document
+    """
+    cache = get_llm_cache()
+    return [
+        cache.lookup(build_prompt(templates, text_content, tables_str))
+        for _, _, text_content, tables_str in documents
+    ]
+
+def store_cached_documents(templates, documents, results):
+    """
+    Cache the result of each document under its single-document prompt.
+    
+    Args:
+        templates: The prompt templates from get_prompt_templates
+        documents: List of (text_content, tables_str) tuples
+        results: LLM result of each document
+    """
+    cache = get_llm_cache()
+    for (text_content, tables_str), result in zip(documents, results):
+        cache.update(build_prompt(templates, text_content, tables_str), result)
+
+async def invoke_llm(prompt_txt, json_mode=False):
+    """
+    Send a prompt to the LLM.
+    
+    Args:
+        prompt_txt: The full prompt
+        json_mode: Whether the LLM must answer with a JSON object
+        
+    Returns:
+        The LLM response message
+    """
+    llm = get_llm()
+    if json_mode:
+        llm = llm.bind(response_format={"type": "json_object"})
+    logger.info("Sending request to LLM")
+    # The cached client outlives each asyncio.run, and its async connection pool is
+    # bound to the event loop that first used it, so call the sync client in a thread
+    return await asyncio.to_thread(llm.invoke, prompt_txt)
+
+async def cached_invoke(prompt_txt, document_text=None):
+    """
+    Invoke the LLM through the two-tier response cache.
+    
+    Args:
+        prompt_txt: The full prompt
+        document_text: The text and tables extracted from the document, or None to
+            only use the exact prompt tier
+        
+    Returns:
+        str: LLM response content
+    """
+    result, embedding = await asyncio.to_thread(lookup_cached_response, prompt_txt, document_text)
+    if result is not None:
+        return result
+    
+    result = (await invoke_llm(prompt_txt)).content
+    await asyncio.to_thread(get_llm_cache().update, prompt_txt, result, embedding)
+    return result
+
+def stream_result(prompt_txt, document_text):
+    """
+    Write the LLM response to the current Streamlit container as it is generated.
+    
+    Args:
+        prompt_txt: The full prompt
+        document_text: The text and tables extracted from the document
+        
+    Returns:
+        str: LLM response content without code fences
+    """
+    result, embedding = lookup_cached_response(prompt_txt, document_text)
+    if result is not None:
+        result = FENCE_RE.sub("", result)
+        st.markdown(result)
+        return result
+    
+    logger.info("Streaming request to LLM")
+    result = st.write_stream(strip_markdown_fences(chunk.content for chunk in get_llm().stream(prompt_txt)))
+    get_llm_cache().update(prompt_txt, result, embedding)
+    logger.info(f"Received response from LLM ({len(result)} characters)")
+    return result
+
+@st.cache_resource(show_spinner=False, ttl=3600)
+def get_prompt_templates():
+    """
+    Fetch the invoice parsing prompt from Pezzo and compile the LLM prompt templates once.
+    
+    The templates are refreshed hourly so edits made in Pezzo are picked up.
+    
     Returns:
-        str: Formatted table string
+        tuple: (document_template, batch_template) as string.Template objects. The document
+            template takes $text and $tables, the batch template $count and $invoices.
     """
-    tables_str = ""
-    tables_str += "\n\n## Tables\n"
-    for i, table in enumerate(tables):
-        tables_str += f"\n### Table {i+1}\n"
-        tables_str += f"Pages: {', '.join(map(str, table['page_numbers']))}\n\n"
+    from elsai_core.prompts import PezzoPromptRenderer
+    
+    logger.info("Fetching invoice parsing prompt")
+    renderer = PezzoPromptRenderer(
+        api_key=st.secrets["PEZZO_API_KEY"],
+        project_id=st.secrets["PEZZO_PROJECT_ID"],
+        environment=st.secrets["PEZZO_ENVIRONMENT"],
+        server_url=st.secrets["PEZZO_SERVER_URL"]
+    )
+    # Escape "$" in the prompt so amounts like "$100" are not read as placeholders
+    prompt = renderer.get_prompt("InvoiceParsingPrompt").replace("$", "$$")
+    document_template = string.Template(
+        prompt + "The content is as follows: Text from the document : $text , Tables from the document : $tables"
+    )
+    batch_template = string.Template(prompt + BATCH_INSTRUCTIONS + "$invoices")
+    return document_template, batch_template
+
+def build_prompt(templates, text_content, tables_str):
+    """
+    Build the LLM prompt for a single document.
+    
+    Args:
+        templates: The prompt templates from get_prompt_templates
+        text_content: The text extracted from the document
+        tables_str: The formatted tables extracted from the document
         
-        # Create simple text representation of table
-        rows = table["row_count"]
-        cols = table["column_count"]
-        grid = [["" for _ in range(cols)] for _ in range(rows)]
+    Returns:
+        str: The full prompt
+    """
+    return templates[0].substitute(text=text_content, tables=tables_str)
+
+def build_batch_prompt(templates, documents):
+    """
+    Build a single LLM prompt covering several documents.
+    
+    Args:
+        templates: The prompt templates from get_prompt_templates
+        documents: List of (text_content, tables_str) tuples
         
-        for cell in table["cells"]:
-            row = cell["row_index"]
-            col = cell["column_index"]
-            grid[row][col] = cell["content"]
+    Returns:
+        str: The full prompt
+    """
+    invoices = "".join(
+        f"\n=== INVOICE {number} ===\nText from the document : {text_content} , Tables from the document : {tables_str}\n"
+        for number, (text_content, tables_str) in enumerate(documents, start=1)
+    )
+    return templates[1].substitute(count=len(documents), invoices=invoices)
+
+async def prepare_pdf(file_name, pdf_bytes):
+    """
+    Extract the content of a PDF file and build the LLM prompt for it.
+    
+    Args:
+        file_name: Name of the PDF file
+        pdf_bytes: Content of the PDF file
         
-        for row in grid:
-            tables_str += " | ".join(row) + "\n"
-    return tables_str
-def process_pdf(file_path):
+    Returns:
+        tuple: (prompt_txt, document_text)
+    """
+    logger.info(f"Extracting content from PDF: {file_name}")
+    (text_content, tables_str), templates = await asyncio.gather(
+        asyncio.to_thread(extract_content_from_pdf, pdf_bytes),
+        asyncio.to_thread(get_prompt_templates)
+    )
+    logger.info("Content extraction completed")
+    prompt_txt = build_prompt(templates, text_content, tables_str)
+    logger.debug("prompt length=%d", len(prompt_txt))
+    return prompt_txt, f"{text_content}\n{tables_str}"
+
+async def process_document(templates, file_name, text_content, tables_str):
     """
-    Process a PDF file.
+    Process the extracted content of a single PDF file with the LLM.
     
     Args:
-        file_path: Path to the PDF file
-        vision_endpoint: Azure Document Intelligence endpoint
-        vision_key: Azure Document Intelligence API key
+        templates: The prompt templates from get_prompt_templates
+        file_name: Name of the PDF file
+        text_content: The text extracted from the document
+        tables_str: The formatted tables extracted from the document
         
     Returns:
         str: LLM processed results
+        
+    Raises:
+        Exception: If the LLM request fails, after logging it
     """
-    file_name = os.path.basename(file_path)
     logger.info(f"Processing PDF file: {file_name}")
     
     try:
-        # Extract content from PDF
-        logger.info("Extracting content from PDF")
-        text_content, tables = extract_content_from_pdf(file_path)
-        tables_str = format_table(tables)
-        logger.info("Content extraction completed")
-        # Process with LLM
-        logger.info("Initializing LLM connector")
-        connector = AzureOpenAIConnector()
-        llm = connector.connect_azure_open_ai(deploymentname="gpt-4o-mini")
-        logger.info("LLM connector initialized")
-           
-        # Combine content for LLM
-        logger.info("Generating prompt for LLM processing")
-        renderer = PezzoPromptRenderer(
-            api_key=st.secrets["PEZZO_API_KEY"],
-            project_id=st.secrets["PEZZO_PROJECT_ID"],
-            environment=st.secrets["PEZZO_ENVIRONMENT"],
-            server_url=st.secrets["PEZZO_SERVER_URL"]
-        )
-        prompt = renderer.get_prompt("InvoiceParsingPrompt") 
-        prompt_txt = prompt+ f"""The content is as follows: Text from the document : {text_content} , Tables from the document : {tables_str}"""
-        print(prompt_txt)
-        logger.info("Sending request to LLM")
-        response = llm.invoke(prompt_txt)
-        result = response.content
+        prompt_txt = build_prompt(templates, text_content, tables_str)
+        logger.debug("prompt length=%d", len(prompt_txt))
+        result = await cached_invoke(prompt_txt, f"{text_content}\n{tables_str}")
         logger.info(f"Received response from LLM ({len(result)} characters)")
         
-        return result
+        return FENCE_RE.sub("", result)
         
     except Exception as e:
         logger.error(f"Error processing PDF {file_name}: {str(e)}", exc_info=True)
-        return f"Error processing PDF: {str(e)}"
+        raise
+
+async def process_batch(templates, batch):
+    """
+    Process a batch of documents with a single LLM request.
+    
+    Falls back to one request per document when the response cannot be split.
+    
+    Args:
+        templates: The prompt templates from get_prompt_templates
+        batch: List of (index, file_name, text_content, tables_str) tuples
+        
+    Returns:
+        dict: LLM processed results keyed by upload index, with the exception in place
+            of the result for files that failed
+    """
+    if len(batch) == 1:
+        index, file_name, text_content, tables_str = batch[0]
+        try:
+            return {index: await process_document(templates, file_name, text_content, tables_str)}
+        except Exception as e:
+            return {index: e}
+    
+    logger.info(f"Processing {len(batch)} PDF files in one LLM request")
+    try:
+        documents = [(text_content, tables_str) for _, _, text_content, tables_str in batch]
+        prompt_txt = build_batch_prompt(templates, documents)
+        logger.debug("prompt length=%d", len(prompt_txt))
+        response = await invoke_llm(prompt_txt, json_mode=True)
+        if response.response_metadata.get("finish_reason") == "length":
+            logger.warning(f"Batched LLM response for {len(batch)} invoices hit the output token limit")
+        invoices = split_batch_response(response.content, len(batch))
+        logger.info(f"Received batched response from LLM for {len(batch)} invoices")
+        # Cache each invoice under its own prompt rather than the batch prompt, so it is
+        # reused when uploaded alone, with other files or in a different order
+        await asyncio.to_thread(store_cached_documents, templates, documents, invoices)
+        return {index: FENCE_RE.sub("", markdown) for (index, _, _, _), markdown in zip(batch, invoices)}
+    
+    except Exception as e:
+        logger.warning(f"Batched LLM request failed, processing files one by one: {str(e)}")
+        results = await asyncio.gather(*(
+            process_document(templates, file_name, text_content, tables_str)
+            for _, file_name, text_content, tables_str in batch
+        ), return_exceptions=True)
+        return {index: result for (index, _, _, _), result in zip(batch, results)}
+
+async def process_all(files, on_result):
+    """
+    Process several PDF files, packing their contents into as few LLM requests as possible.
+    
+    Args:
+        files: List of (file_name, pdf_bytes) tuples
+        on_result: Called with (index, result) for each file as soon as its result is
+            available. The result is the exception for files that failed.
+    """
+    logger.info(f"Processing {len(files)} PDF file(s) concurrently")
+    
+    # Extract all files and fetch the prompt concurrently
+    *contents, templates = await asyncio.gather(
+        *(asyncio.to_thread(extract_content_from_pdf, pdf_bytes) for _, pdf_bytes in files),
+        asyncio.to_thread(get_prompt_templates),
+        return_exceptions=True
+    )
+    documents = []
+    for index, ((file_name, _), content) in enumerate(zip(files, contents)):
+        if isinstance(content, Exception):
+            logger.error(f"Error processing PDF {file_name}: {str(content)}")
+            on_result(index, content)
+        elif isinstance(templates, Exception):
+            on_result(index, templates)
+        else:
+            documents.append((index, file_name, *content))
+    
+    # Only invoices without a cached result are sent to the LLM
+    misses = []
+    cached = await asyncio.to_thread(lookup_cached_documents, templates, documents)
+    for document, result in zip(documents, cached):
+        if result is None:
+            misses.append(document)
+        else:
+            on_result(document[0], FENCE_RE.sub("", result))
+    
+    for batch_result in asyncio.as_completed([process_batch(templates, batch) for batch in pack_documents(misses)]):
+        for index, result in (await batch_result).items():
+            on_result(index, result)
+
+def download_results(file_name, result, index):
+    """
+    Add a download button for the results of a file.
+    
+    Args:
+        file_name: Name of the PDF file
+        result: LLM processed results
+        index: Position of the file in the upload, used to keep widget keys unique
+    """
+    st.download_button(
+        label="Download results as markdown",
+        data=result,
+        file_name=f"{os.path.splitext(file_name)[0]}_results.md",
+        mime="text/markdown",
+        key=f"download_{index}"
+    )
 
 def main():
     """
@@ -148,48 +465,59 @@ def main():
         
         # Process files when user clicks the button
         if st.button("Process Files"):
+            # Set up a progress bar per file
+            progress_bars = []
+            status_texts = []
             for uploaded_file in uploaded_files:
-                # Create progress bar for this file
                 progress_bar = st.progress(0)
                 status_text = st.empty()
-                
-                status_text.text(f"Processing: {uploaded_file.name}...")
-                
-                # Save uploaded file to temporary location
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                    temp_file.write(uploaded_file.getvalue())
-                    temp_file_path = temp_file.name
-                
+                status_text.text(f"Analyzing document: {uploaded_file.name}")
+                progress_bar.progress(25)
+                progress_bars.append(progress_bar)
+                status_texts.append(status_text)
+            
+            if len(uploaded_files) == 1:
+                # Stream the response of a single file so it shows up as it is generated
+                uploaded_file = uploaded_files[0]
                 try:
-                    progress_bar.progress(25)
-                    status_text.text(f"Analyzing document: {uploaded_file.name}")
-                    
-                    # Process the PDF
-                    result = process_pdf(temp_file_path).replace("```markdown","").replace("```","")
+                    prompt_txt, document_text = asyncio.run(prepare_pdf(uploaded_file.name, uploaded_file.getvalue()))
                     
-                    progress_bar.progress(100)
-                    status_text.text(f"Completed: {uploaded_file.name}")
+                    progress_bars[0].progress(50)
+                    status_texts[0].text(f"Generating results: {uploaded_file.name}")
                     
                     # Display results in an expander
                     with st.expander(f"Results for {uploaded_file.name}", expanded=True):
-                        st.markdown(result)
-                        
-                        # Add download button for the results
-                        st.download_button(
-                            label="Download results as markdown",
-                            data=result,
-                            file_name=f"{os.path.splitext(uploaded_file.name)[0]}_results.md",
-                            mime="text/markdown"
-                        )               
+                        result = stream_result(prompt_txt, document_text)
+                        download_results(uploaded_file.name, result, 0)
+                    
+                    progress_bars[0].progress(100)
+                    status_texts[0].text(f"Completed: {uploaded_file.name}")
                 except Exception as e:
-                    progress_bar.progress(100)
-                    status_text.text(f"Error processing: {uploaded_file.name}")
+                    logger.error(f"Error processing PDF {uploaded_file.name}: {str(e)}", exc_info=True)
+                    progress_bars[0].progress(100)
+                    status_texts[0].text(f"Error processing: {uploaded_file.name}")
                     st.error(f"Error processing {uploaded_file.name}: {str(e)}")
+            else:
+                def show_result(index, result):
+                    uploaded_file = uploaded_files[index]
+                    progress_bars[index].progress(100)
+                    if isinstance(result, Exception):
+                        status_texts[index].text(f"Error processing: {uploaded_file.name}")
+                        st.error(f"Error processing {uploaded_file.name}: {str(result)}")
+                        return
+                    
+                    status_texts[index].text(f"Completed: {uploaded_file.name}")
+                    
+                    # Display results in an expander
+                    with st.expander(f"Results for {uploaded_file.name}", expanded=True):
+                        st.markdown(result)
+                        download_results(uploaded_file.name, result, index)
                 
-                finally:
-                    # Clean up temporary file
-                    if os.path.exists(temp_file_path):
-                        os.unlink(temp_file_path)
+                # Results are shown as each batch completes, on this thread
+                asyncio.run(process_all(
+                    [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files],
+                    show_result
+                ))
                 
             st.success("All files processed!")
     else:
@@ -9,8 +9,13 @@ def setup_logger():
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
 
+    # Every elsai_core class calls this, so only attach the console handler once
+    if any(handler.get_name() == "elsai_console" for handler in logger.handlers):
+        return logger
+
     # Console handler to log to terminal
     console_handler = logging.StreamHandler()
+    console_handler.set_name("elsai_console")
     console_handler.setLevel(logging.INFO)
     # Create a formatter and set it for the handler
     formatter = logging.Formatter('%(levelname)s: %(message)s')
@@ -7,18 +7,51 @@ class AzureDocumentIntelligence:
     Class to handle document analysis using Azure Document Intelligence.
     """
 
-    def __init__(self, file_path:str):
+    def __init__(self, file_path:str = None, client: DocumentIntelligenceClient = None, file_bytes: bytes = None):
+        """
+        file_path: str = Path of the document to analyze
+        client: DocumentIntelligenceClient = Existing client to reuse. When omitted, a client is
+            created from the VISION_KEY and VISION_ENDPOINT environment variables.
+        file_bytes: bytes = Content of the document, sent as is instead of reading file_path
+        """
         self.logger = setup_logger()
+        if file_path is None and file_bytes is None:
+            raise ValueError("Either file_path or file_bytes must be provided.")
+        self.file_path = file_path
+        self.file_bytes = file_bytes
+        self.document_name = file_path if file_path is not None else "in-memory document"
+        if client is not None:
+            self.client = client
+            return
         # Set up API key and endpoint
         self.key = os.environ["VISION_KEY"]
         self.endpoint = os.environ["VISION_ENDPOINT"]
-        self.file_path = file_path
         # Initialize the Document Intelligence Client
         self.client = DocumentIntelligenceClient(
             endpoint=self.endpoint,
             credential=AzureKeyCredential(self.key)
         )
 
+    def _begin_analysis(self, pages: str = None):
+        """
+        Starts a layout analysis of the document and returns the poller.
+        """
+        if self.file_bytes is not None:
+            return self.client.begin_analyze_document(
+                model_id="prebuilt-layout",
+                body=self.file_bytes,
+                content_type="application/octet-stream",
+                pages=pages
+            )
+        with open(self.file_path, "rb") as f:
+            self.logger.info("Opened file: %s", self.file_path)
+            return self.client.begin_analyze_document(
+                model_id="prebuilt-layout",
+                body=f,
+                content_type="application/octet-stream",
+                pages=pages
+            )
+
     def extract_text(self, pages: str = None) -> str:
         """
         Extracts text from a document with optional page selection.
@@ -31,28 +64,21 @@ class AzureDocumentIntelligence:
             str: Extracted text content from the document.
         """
 
-        self.logger.info("Starting text extraction from %s", self.file_path)
+        self.logger.info("Starting text extraction from %s", self.document_name)
         try:
 
-            with open(self.file_path, "rb") as f:
-                self.logger.info("Opened file: %s", self.file_path)
-                poller = self.client.begin_analyze_document(
-                    model_id="prebuilt-layout",
-                    body=f,
-                    content_type="application/octet-stream",
-                    pages=pages
-                )
+            poller = self._begin_analysis(pages)
 
-            self.logger.info("Analysis started for %s. Waiting for result...", self.file_path)
+            self.logger.info("Analysis started for %s. Waiting for result...", self.document_name)
             # Get the result of the analysis
             result = poller.result()
-            self.logger.info("Analysis completed for %s", self.file_path)
+            self.logger.info("Analysis completed for %s", self.document_name)
             ocr_output = result.as_dict()
-            self.logger.info("Text extraction from %s completed successfully.", self.file_path)
+            self.logger.info("Text extraction from %s completed successfully.", self.document_name)
             return ocr_output['content']
 
         except Exception as e:
-            self.logger.error("Error while extracting text from %s: %s", self.file_path, e)
+            self.logger.error("Error while extracting text from %s: %s", self.document_name, e)
             raise
     def extract_tables(self, pages: str = None):
         """
@@ -64,61 +90,86 @@ class AzureDocumentIntelligence:
         Returns:
             list: List of dictionaries containing table data.
         """
-        self.logger.info("Starting table extraction from %s", self.file_path)
+        self.logger.info("Starting table extraction from %s", self.document_name)
         try:
-            with open(self.file_path, "rb") as f:
-                self.logger.info("Opened file: %s", self.file_path)
-                poller = self.client.begin_analyze_document(
-                    model_id="prebuilt-layout",
-                    body=f,
-                    content_type="application/octet-stream",
-                    pages=pages
-                )
+            poller = self._begin_analysis(pages)
                 
-            self.logger.info("Analysis started for %s. Waiting for result...", self.file_path)
+            self.logger.info("Analysis started for %s. Waiting for result...", self.document_name)
             # Get the result of the analysis
             result = poller.result()
-            self.logger.info("Analysis completed for %s", self.file_path)
-            
-            extracted_tables = []
+            self.logger.info("Analysis completed for %s", self.document_name)
             
-            if result.tables:
-                self.logger.info(f"Found {len(result.tables)} tables to extract")
-                for table_idx, table in enumerate(result.tables):
-                    self.logger.info(f"Processing table {table_idx+1} with {table.row_count} rows and {table.column_count} columns")
-                    # Create a table representation
-                    table_data = {
-                        "table_id": table_idx,
-                        "row_count": table.row_count,
-                        "column_count": table.column_count,
-                        "page_numbers": [],
-                        "cells": []
-                    }
-                    
-                    # Add page numbers where this table appears
-                    if table.bounding_regions:
-                        for region in table.bounding_regions:
-                            if region.page_number not in table_data["page_numbers"]:
-                                table_data["page_numbers"].append(region.page_number)
-                    
-                    # Extract cell data
-                    for cell in table.cells:
-                        cell_data = {
-                            "row_index": cell.row_index,
-                            "column_index": cell.column_index,
-                            "content": cell.content,
-                            "is_header": cell.kind == "columnHeader" if hasattr(cell, "kind") else False,
-                            "spans": cell.column_span if hasattr(cell, "column_span") else 1
-                        }
-                        table_data["cells"].append(cell_data)
-                    
-                    extracted_tables.append(table_data)
-                    self.logger.info(f"Extracted table {table_idx+1} with {len(table_data['cells'])} cells")
+            extracted_tables = self._parse_tables(result)
             
             self.logger.info(f"Table extraction complete. Extracted {len(extracted_tables)} tables")
             return extracted_tables
                 
         except Exception as e:
-            self.logger.error("Error while extracting tables from %s: %s", self.file_path, e)
+            self.logger.error("Error while extracting tables from %s: %s", self.document_name, e)
             raise
 
+    def extract_content(self, pages: str = None):
+        """
+        Extracts text and tables from a document with a single analysis request.
+
+        Args:
+            pages (str, optional): Specific pages to analyze (e.g., "1,3"). Defaults to None.
+
+        Returns:
+            tuple: (extracted_text, extracted_tables)
+        """
+        self.logger.info("Starting content extraction from %s", self.document_name)
+        try:
+            poller = self._begin_analysis(pages)
+
+            self.logger.info("Analysis started for %s. Waiting for result...", self.document_name)
+            result = poller.result()
+            self.logger.info("Analysis completed for %s", self.document_name)
+
+            extracted_tables = self._parse_tables(result)
+            self.logger.info("Content extraction from %s completed successfully.", self.document_name)
+            return result.content, extracted_tables
+
+        except Exception as e:
+            self.logger.error("Error while extracting content from %s: %s", self.document_name, e)
+            raise
+
+    def _parse_tables(self, result) -> list:
+        """
+        Converts the tables of an analysis result into a list of dictionaries.
+        """
+        extracted_tables = []
+        
+        if result.tables:
+            self.logger.info(f"Found {len(result.tables)} tables to extract")
+            for table_idx, table in enumerate(result.tables):
+                self.logger.info(f"Processing table {table_idx+1} with {table.row_count} rows and {table.column_count} columns")
+                # Create a table representation
+                table_data = {
+                    "table_id": table_idx,
+                    "row_count": table.row_count,
+                    "column_count": table.column_count,
+                    "page_numbers": [],
+                    "cells": []
+                }
+                
+                # Add page numbers where this table appears, keeping the first occurrence of each
+                if table.bounding_regions:
+                    table_data["page_numbers"] = list(
+                        dict.fromkeys(region.page_number for region in table.bounding_regions)
+                    )
+                
+                # Extract cell data
+                for cell in table.cells:
+                    cell_data = {
+                        "row_index": cell.row_index,
+                        "column_index": cell.column_index,
+                        "content": cell.content,
+                        "is_header": getattr(cell, "kind", None) == "columnHeader",
+                        "spans": getattr(cell, "column_span", 1)
+                    }
+                    table_data["cells"].append(cell_data)
+                
+                extracted_tables.append(table_data)
+                self.logger.info(f"Extracted table {table_idx+1} with {len(table_data['cells'])} cells")
+        return extracted_tables
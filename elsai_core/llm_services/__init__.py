@@ -1,5 +1,7 @@
 from .summarization_service import SummarizationService
+from .semantic_cache import SemanticLLMCache
 
 __all__ = [
     "SummarizationService",
+    "SemanticLLMCache",
 ]
\ No newline at end of file
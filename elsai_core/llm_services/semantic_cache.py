@@ -0,0 +1,127 @@
+import hashlib
+from contextlib import contextmanager
+import sqlite3
+import time
+from typing import List, Optional
+import numpy as np
+from elsai_core.config.loggerConfig import setup_logger
+
+
+class SemanticLLMCache:
+
+    """
+        A two-tier cache for LLM responses stored in SQLite.
+
+        Prompts are looked up by the SHA256 hash of their exact text. When a
+        similarity threshold is set, entries can also be matched by cosine
+        similarity between embeddings.
+    """
+    def __init__(
+        self,
+        db_path: str = "llm_cache.sqlite",
+        similarity_threshold: Optional[float] = None,
+        ttl_days: int = 7
+    ):
+        """
+        db_path: str = Path of the SQLite database file
+        similarity_threshold: float = Minimum cosine similarity for a semantic hit.
+            Semantic lookups are disabled when None.
+        ttl_days: int = Number of days an entry stays valid
+        """
+        self.logger = setup_logger()
+        self.db_path = db_path
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "prompt_hash TEXT PRIMARY KEY, "
+                "embedding BLOB, "
+                "response TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a new connection per operation, so the cache can be shared between threads.
+        Commits on success, rolls back on error and always closes the connection.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def hash_prompt(prompt: str) -> str:
+        """
+        Returns the SHA256 hex digest of the prompt.
+        """
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """
+        Returns the cached response for exactly this prompt, or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response FROM llm_cache WHERE prompt_hash = ? AND created_at >= ?",
+                (self.hash_prompt(prompt), time.time() - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+        self.logger.info("LLM cache hit on exact prompt hash.")
+        return row[0]
+
+    def lookup_similar(self, embedding: List[float]) -> Optional[str]:
+        """
+        Returns the cached response whose embedding is most similar to the given one,
+        if the cosine similarity reaches the threshold, or None.
+        Always returns None when semantic lookups are disabled.
+        """
+        if self.similarity_threshold is None:
+            return None
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT embedding, response FROM llm_cache "
+                "WHERE embedding IS NOT NULL AND created_at >= ?",
+                (time.time() - self.ttl_seconds,)
+            ).fetchall()
+        query = self._normalize(embedding)
+        candidates = [
+            (np.frombuffer(stored, dtype=np.float32), response)
+            for stored, response in rows
+        ]
+        candidates = [(vector, response) for vector, response in candidates if vector.shape == query.shape]
+        if not candidates:
+            return None
+
+        # Stored vectors are normalized, so the dot product is the cosine similarity
+        similarities = np.stack([vector for vector, _ in candidates]) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        self.logger.info("LLM cache hit on embedding similarity %.4f.", similarities[best])
+        return candidates[best][1]
+
+    def update(self, prompt: str, response: str, embedding: Optional[List[float]] = None) -> None:
+        """
+        Stores the response for the prompt and drops expired entries.
+        """
+        stored = self._normalize(embedding).tobytes() if embedding else None
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (prompt_hash, embedding, response, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (self.hash_prompt(prompt), stored, response, now)
+            )
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,121 @@
+import json
+import re
+import numpy as np
+
+# Multi-file uploads are packed into as few LLM requests as these limits allow. Every
+# invoice's markdown has to come back in one completion, and gpt-4o-mini stops at about
+# 16k output tokens, so batches are bounded by their estimated output with room left
+# for JSON escaping.
+MAX_BATCH_OUTPUT_TOKENS = 10000
+MAX_BATCH_SIZE = 5
+
+# Markdown code fences the LLM wraps its results in
+FENCE_RE = re.compile(r"```(?:markdown)?")
+
+def format_table(tables):
+    """
+    Format the table into a string representation.
+    
+    Args:
+        table: The table object to format
+    Returns:
+        str: Formatted table string
+    """
+    parts = ["\n\n## Tables\n"]
+    append = parts.append
+    for i, table in enumerate(tables):
+        append(f"\n### Table {i+1}\n")
+        append(f"Pages: {', '.join(map(str, table['page_numbers']))}\n\n")
+        
+        # Create simple text representation of table
+        rows = table["row_count"]
+        cols = table["column_count"]
+        grid = np.full((rows, cols), "", dtype=object)
+        
+        if table["cells"]:
+            row_indices, col_indices, contents = zip(
+                *[(cell["row_index"], cell["column_index"], cell["content"]) for cell in table["cells"]]
+            )
+            grid[list(row_indices), list(col_indices)] = list(contents)
+        
+        # Only join each row up to its last occupied column, trailing blanks carry no data
+        occupied = grid != ""
+        if occupied.size:
+            widths = np.where(occupied.any(axis=1), cols - occupied[:, ::-1].argmax(axis=1), 0)
+        else:
+            widths = np.zeros(rows, dtype=int)
+        append("".join(" | ".join(row[:width]) + "\n" for row, width in zip(grid, widths)))
+    return "".join(parts)
+
+def strip_markdown_fences(chunks):
+    """
+    Remove markdown code fences from a stream of text chunks.
+    
+    A fence split across chunks is held back until the next chunk completes it.
+    
+    Args:
+        chunks: Iterable of text chunks
+        
+    Yields:
+        str: Text chunks without code fences
+    """
+    fence = "```markdown"
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        hold = max((n for n in range(1, len(fence)) if pending.endswith(fence[:n])), default=0)
+        ready, pending = pending[:len(pending) - hold], pending[len(pending) - hold:]
+        if ready:
+            yield FENCE_RE.sub("", ready)
+    if pending:
+        yield FENCE_RE.sub("", pending)
+
+def pack_documents(documents):
+    """
+    Group documents into batches whose results fit in a single LLM completion.
+    
+    The markdown result of an invoice is estimated to be about as long as its
+    extracted content.
+    
+    Args:
+        documents: List of (index, file_name, text_content, tables_str) tuples
+        
+    Returns:
+        list: Batches of documents, in upload order
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for document in documents:
+        # Roughly four characters per token
+        tokens = (len(document[2]) + len(document[3])) // 4
+        if batch and (batch_tokens + tokens > MAX_BATCH_OUTPUT_TOKENS or len(batch) == MAX_BATCH_SIZE):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(document)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def split_batch_response(response, count):
+    """
+    Split a batched LLM response into the result of each invoice.
+    
+    Args:
+        response: The JSON response to a batch prompt
+        count: Number of invoices in the batch
+        
+    Returns:
+        list: Markdown result of each invoice, in batch order
+        
+    Raises:
+        ValueError: If the response is not valid JSON or misses an invoice
+        KeyError, TypeError: If the JSON does not have the expected shape
+    """
+    invoices = {int(invoice["invoice"]): invoice["markdown"] for invoice in json.loads(response)["invoices"]}
+    missing = [number for number in range(1, count + 1) if number not in invoices]
+    if missing:
+        raise ValueError(f"Batched response is missing invoices {missing}")
+    return [invoices[number] for number in range(1, count + 1)]
@@ -0,0 +1,155 @@
+import json
+import pytest
+from invoice_helpers import (
+    MAX_BATCH_OUTPUT_TOKENS,
+    MAX_BATCH_SIZE,
+    format_table,
+    pack_documents,
+    split_batch_response,
+    strip_markdown_fences,
+)
+
+
+def document(index, tokens):
+    return (index, f"invoice_{index}.pdf", "x" * (tokens * 4), "")
+
+
+def batch_response(*invoices):
+    return json.dumps({"invoices": [{"invoice": number, "markdown": markdown} for number, markdown in invoices]})
+
+
+def test_pack_documents_limits_batch_size():
+    documents = [document(index, 10) for index in range(MAX_BATCH_SIZE + 2)]
+
+    batches = pack_documents(documents)
+
+    assert [len(batch) for batch in batches] == [MAX_BATCH_SIZE, 2]
+    assert [doc for batch in batches for doc in batch] == documents
+
+
+def test_pack_documents_limits_estimated_output():
+    half = MAX_BATCH_OUTPUT_TOKENS // 2
+    documents = [document(0, half), document(1, half), document(2, 1)]
+
+    batches = pack_documents(documents)
+
+    assert [[doc[0] for doc in batch] for batch in batches] == [[0, 1], [2]]
+
+
+def test_pack_documents_keeps_oversized_document_alone():
+    documents = [document(0, 1), document(1, MAX_BATCH_OUTPUT_TOKENS * 2), document(2, 1)]
+
+    batches = pack_documents(documents)
+
+    assert [[doc[0] for doc in batch] for batch in batches] == [[0], [1], [2]]
+
+
+def test_pack_documents_without_documents():
+    assert pack_documents([]) == []
+
+
+def test_split_batch_response_orders_invoices_by_number():
+    response = batch_response((2, "second"), (3, "third"), (1, "first"))
+
+    assert split_batch_response(response, 3) == ["first", "second", "third"]
+
+
+def test_split_batch_response_accepts_numeric_strings():
+    response = batch_response(("1", "first"), ("2", "second"))
+
+    assert split_batch_response(response, 2) == ["first", "second"]
+
+
+def test_split_batch_response_rejects_missing_invoices():
+    response = batch_response((1, "first"), (3, "third"))
+
+    with pytest.raises(ValueError, match=r"\[2\]"):
+        split_batch_response(response, 3)
+
+
+def test_split_batch_response_rejects_non_integer_invoice_numbers():
+    response = batch_response(("first", "first"), (2, "second"))
+
+    with pytest.raises(ValueError):
+        split_batch_response(response, 2)
+
+
+def test_split_batch_response_rejects_truncated_json():
+    response = batch_response((1, "first"), (2, "second"))[:-10]
+
+    with pytest.raises(ValueError):
+        split_batch_response(response, 2)
+
+
+def test_split_batch_response_rejects_unexpected_shape():
+    with pytest.raises(KeyError):
+        split_batch_response(json.dumps({"results": []}), 1)
+
+
+def test_strip_markdown_fences_removes_fences_split_across_chunks():
+    chunks = ["```mark", "down\n# Invoice", "\n``", "`"]
+
+    assert "".join(strip_markdown_fences(chunks)) == "\n# Invoice\n"
+
+
+def test_strip_markdown_fences_releases_held_back_text():
+    chunks = ["Total: 5 `", "code` here", " ``"]
+
+    assert "".join(strip_markdown_fences(chunks)) == "Total: 5 `code` here ``"
+
+
+def test_strip_markdown_fences_without_chunks():
+    assert list(strip_markdown_fences([])) == []
+
+
+def table(rows, cols, cells, pages=(1,)):
+    return {
+        "row_count": rows,
+        "column_count": cols,
+        "page_numbers": list(pages),
+        "cells": [
+            {"row_index": row, "column_index": col, "content": content}
+            for row, col, content in cells
+        ],
+    }
+
+
+def test_format_table_trims_trailing_empty_cells():
+    tables = [table(2, 3, [(0, 0, "Item"), (0, 1, "Qty"), (0, 2, "Price"), (1, 0, "Pen"), (1, 1, "2")])]
+
+    assert format_table(tables) == (
+        "\n\n## Tables\n"
+        "\n### Table 1\n"
+        "Pages: 1\n\n"
+        "Item | Qty | Price\n"
+        "Pen | 2\n"
+    )
+
+
+def test_format_table_keeps_inner_empty_cells_and_empty_rows():
+    tables = [table(3, 3, [(0, 0, "A"), (0, 2, "C"), (2, 1, "B")], pages=(1, 2))]
+
+    assert format_table(tables).endswith(
+        "Pages: 1, 2\n\n"
+        "A |  | C\n"
+        "\n"
+        " | B\n"
+    )
+
+
+def test_format_table_without_rows_or_cells():
+    tables = [table(0, 0, []), table(2, 2, [])]
+
+    assert format_table(tables) == (
+        "\n\n## Tables\n"
+        "\n### Table 1\n"
+        "Pages: 1\n\n"
+        "\n### Table 2\n"
+        "Pages: 1\n\n"
+        "\n"
+        "\n"
+    )
+
+
+def test_format_table_without_tables():
+    assert format_table([]) == "\n\n## Tables\n"
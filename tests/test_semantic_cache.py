@@ -0,0 +1,86 @@
+import time
+import pytest
+from elsai_core.llm_services import SemanticLLMCache
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "llm_cache.sqlite")
+
+
+def test_lookup_returns_response_for_exact_prompt(db_path):
+    cache = SemanticLLMCache(db_path=db_path)
+    cache.update("prompt", "response")
+
+    assert cache.lookup("prompt") == "response"
+    assert cache.lookup("other prompt") is None
+
+
+def test_update_replaces_existing_response(db_path):
+    cache = SemanticLLMCache(db_path=db_path)
+    cache.update("prompt", "first")
+    cache.update("prompt", "second")
+
+    assert cache.lookup("prompt") == "second"
+
+
+def test_lookup_similar_is_disabled_by_default(db_path):
+    cache = SemanticLLMCache(db_path=db_path)
+    cache.update("prompt", "response", [1.0, 0.0, 0.0])
+
+    assert cache.lookup_similar([1.0, 0.0, 0.0]) is None
+
+
+def test_lookup_similar_respects_threshold(db_path):
+    cache = SemanticLLMCache(db_path=db_path, similarity_threshold=0.95)
+    cache.update("prompt", "response", [1.0, 0.0, 0.0])
+
+    assert cache.lookup_similar([2.0, 0.1, 0.0]) == "response"
+    assert cache.lookup_similar([1.0, 1.0, 0.0]) is None
+
+
+def test_lookup_similar_returns_closest_match(db_path):
+    cache = SemanticLLMCache(db_path=db_path, similarity_threshold=0.9)
+    cache.update("first", "first response", [1.0, 0.2, 0.0])
+    cache.update("second", "second response", [1.0, 0.0, 0.0])
+
+    assert cache.lookup_similar([1.0, 0.01, 0.0]) == "second response"
+
+
+def test_lookup_similar_ignores_embeddings_of_other_dimensions(db_path):
+    cache = SemanticLLMCache(db_path=db_path, similarity_threshold=0.9)
+    cache.update("prompt", "response", [1.0, 0.0, 0.0])
+
+    assert cache.lookup_similar([1.0, 0.0]) is None
+
+
+def test_update_without_embedding_is_exact_only(db_path):
+    cache = SemanticLLMCache(db_path=db_path, similarity_threshold=0.0)
+    cache.update("prompt", "response", None)
+
+    assert cache.lookup("prompt") == "response"
+    assert cache.lookup_similar([1.0, 0.0, 0.0]) is None
+
+
+def test_expired_entries_are_not_returned(db_path, monkeypatch):
+    cache = SemanticLLMCache(db_path=db_path, similarity_threshold=0.9, ttl_days=7)
+    cache.update("prompt", "response", [1.0, 0.0, 0.0])
+
+    eight_days_later = time.time() + 8 * 24 * 60 * 60
+    monkeypatch.setattr(time, "time", lambda: eight_days_later)
+
+    assert cache.lookup("prompt") is None
+    assert cache.lookup_similar([1.0, 0.0, 0.0]) is None
+
+
+def test_update_drops_expired_entries(db_path, monkeypatch):
+    cache = SemanticLLMCache(db_path=db_path, ttl_days=7)
+    cache.update("old prompt", "old response")
+
+    eight_days_later = time.time() + 8 * 24 * 60 * 60
+    monkeypatch.setattr(time, "time", lambda: eight_days_later)
+    cache.update("new prompt", "new response")
+
+    with cache._connect() as conn:
+        rows = conn.execute("SELECT response FROM llm_cache").fetchall()
+    assert rows == [("new response",)]